@@ -1,6 +1,6 @@
 import numpy as np
 import numpy.random as random
-from ..relations import Relation
+from ..relations import Relation, LN10
 
 
 class GalaxySize(Relation):
@@ -20,12 +20,16 @@ class GalaxySize(Relation):
         """Lognormal scatter"""
         raise NotImplementedError('This is an abstract class.')
 
-    def __call__(self, mstar):
-        median = self.central_value(mstar)
+    def __call__(self, mstar, noise=None):
+        """Returns zero size for dark (mstar=0) galaxies."""
+        mstar = np.asarray(mstar)
+        is_galaxy = mstar > 0
+        median = self.central_value(np.where(is_galaxy, mstar, 1.))
         if self.sample_scatter:
-            return median * 10**random.normal(loc=0,scale=self.scatter(),size=len(mstar))
-        else:
-            return median
+            if noise is None:
+                noise = random.standard_normal(size=len(mstar))
+            median = median * np.exp(LN10*self.scatter()*noise)
+        return median * is_galaxy
 
 
 
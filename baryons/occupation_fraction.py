@@ -16,8 +16,9 @@ class OccupationFraction(Relation):
     def __call__(self, mass):
         return self.central_value(mass)
 
-    def mask_dark_galaxies(self, mass):
-        return np.less_equal(random.random(size=len(mass)), self.__call__(mass))
+    def mask_dark_galaxies(self, mass, rng=None):
+        rng = random if rng is None else rng
+        return np.less_equal(rng.random(size=len(mass)), self.__call__(mass))
 
 
 
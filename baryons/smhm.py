@@ -1,14 +1,103 @@
+import os
 import warnings
+import functools
+import hashlib
+import tempfile
 import numpy as np
 import numpy.random as random
-from scipy.interpolate import interp1d
 from scipy.optimize import brentq
-from ..relations import Relation
+from ..relations import Relation, LN10
 from .. import DISDIR
 
 import colossus
 cosmo = colossus.cosmology.cosmology.setCosmology('planck18')
 
+# below this many halos, the plain numpy expression beats the numba kernel
+MOSTER13_NUMBA_MIN_SIZE = 10**6
+
+
+
+def _log_table(mh, ms):
+    """Tabulated relation in log space, sorted by ascending halo mass."""
+    isort = np.argsort(mh, kind='mergesort')
+    return np.log(mh[isort]), np.log(ms[isort])
+
+def _end_slopes(x, y):
+    """Slopes of the first and last segments of a tabulated relation."""
+    return (y[1]-y[0])/(x[1]-x[0]), (y[-1]-y[-2])/(x[-1]-x[-2])
+
+def _interp_extrapolate(x, xp, fp, slopes):
+    """
+    Linear interpolation via np.interp, linearly extrapolating beyond the
+    ends of the table (like interp1d with fill_value='extrapolate').
+    """
+    y = np.interp(x, xp, fp)
+    y = np.where(x < xp[0],  fp[0]  + slopes[0]*(x-xp[0]),  y)
+    y = np.where(x > xp[-1], fp[-1] + slopes[1]*(x-xp[-1]), y)
+    return y
+
+@functools.lru_cache(maxsize=None)
+def _brook14_to_200c(disdir, h0):
+    """
+    Brook+ 2014 halo masses and radii converted from 350c to 200c, assuming
+    NFW.  The colossus conversion is slow, so the result is cached to disk
+    next to the data file and reloaded on later imports.  The cache file is
+    keyed on the data file's contents, h0, and the colossus setup.
+    """
+    datadir = disdir+'/data/smhm'
+    c_model = 'diemer19'
+    with open(datadir+'/brook.dat', 'rb') as f:
+        key = hashlib.sha1(f.read())
+    key.update(repr((h0, c_model, getattr(colossus, '__version__', None))).encode())
+    fn = datadir+'/brook-200c-'+key.hexdigest()[:16]+'.npy'
+
+    try:
+        return np.load(fn)
+    except (OSError, ValueError, EOFError):
+        pass  # missing, or left truncated by an interrupted write; recompute
+
+    mh350 = np.loadtxt(datadir+'/brook.dat', usecols=0)
+    c350 = colossus.halo.concentration.concentration(mh350/h0, '350c', 0, model=c_model)
+    m200_div_h, r200_div_h, c200 = colossus.halo.mass_defs.changeMassDefinition(mh350/h0, c350, 0, '350c', '200c')
+    table = np.array([m200_div_h * h0, r200_div_h * h0])
+
+    # write atomically so concurrent imports never read a partial file
+    try:
+        fd, tmpfn = tempfile.mkstemp(dir=datadir, suffix='.npy.tmp')
+    except OSError:
+        return table  # e.g. read-only install; recompute next time
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, table)
+        os.chmod(tmpfn, 0o644)  # mkstemp creates files readable by the owner only
+        os.replace(tmpfn, fn)
+    except OSError:
+        if os.path.exists(tmpfn): os.remove(tmpfn)
+    return table
+
+@functools.lru_cache(maxsize=None)
+def _moster13_kernel():
+    """
+    Moster+ 2013 double power law fused into one parallel numba loop, or
+    None if numba is unavailable or only one thread is available.  numba is
+    imported here, on first use, so it does not slow down importing dis.
+    """
+    try:
+        import numba
+    except ImportError:
+        return None
+    if numba.config.NUMBA_NUM_THREADS < 2:
+        return None
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def kernel(mass, M1, N, beta, gamma):
+        out = np.empty_like(mass)
+        for i in numba.prange(mass.size):
+            r = mass[i]/M1
+            out[i] = 2 * N * mass[i] / ( r**-beta + r**gamma )
+        return out
+    return kernel
+
 
 
 class SMHM(Relation):
@@ -23,15 +112,22 @@ class SMHM(Relation):
     def central_value(cls, mass, z=0.):
         raise NotImplementedError('This is an abstract class.')
 
+    @classmethod
+    def central_value_log(cls, logmass, z=0.):
+        """Natural log of the stellar mass, given the natural log of the halo mass."""
+        return np.log(cls.central_value(np.exp(logmass), z=z))
+
     @staticmethod
     def scatter():
         """Lognormal scatter"""
         raise NotImplementedError('This is an abstract class.')
 
-    def __call__(self, mass, z=0.):
+    def __call__(self, mass, z=0., noise=None):
         median = self.central_value(mass, z=z)
         if self.sample_scatter:
-            return median * 10**random.normal(loc=0,scale=self.scatter(),size=len(mass))
+            if noise is None:
+                noise = random.standard_normal(size=np.shape(mass))
+            return median * np.exp(LN10*self.scatter()*noise)
         else:
             return median
 
@@ -60,6 +156,9 @@ class Moster13(SMHM):
         N     = N10_M13 + N11_M13 * z/(z+1)
         beta  = b10_M13 + b11_M13 * z/(z+1)
         gamma = g10_M13 + g11_M13 * z/(z+1)
+        mass = np.asarray(mass, dtype=float)
+        if mass.size >= MOSTER13_NUMBA_MIN_SIZE and _moster13_kernel() is not None:
+            return _moster13_kernel()(mass.ravel(), M1, N, beta, gamma).reshape(mass.shape)[()]
         return 2 * N * mass / ( (mass/M1)**-beta + (mass/M1)**gamma )
 
     @staticmethod
@@ -75,12 +174,17 @@ class Dooley17(SMHM):
 
     # load data
     mhD17,msD17 = np.loadtxt(DISDIR+'/data/smhm/dooley.dat' ,unpack=True)
-    mstarD17 = interp1d(np.log(mhD17),np.log(msD17),kind='linear',fill_value='extrapolate',bounds_error=False)
+    _logmh, _logms = _log_table(mhD17, msD17)
+    _slopes = _end_slopes(_logmh, _logms)
     
     @classmethod
     def central_value(cls, mass, z=0.):
-        if z != 0: warnings.warn('Dooley+ 2017 SMHM has no support for z>0, using z=0 relation!')            
-        return np.exp(cls.mstarD17(np.log(mass)))
+        return np.exp(cls.central_value_log(np.log(mass), z=z))
+
+    @classmethod
+    def central_value_log(cls, logmass, z=0.):
+        if z != 0: warnings.warn('Dooley+ 2017 SMHM has no support for z>0, using z=0 relation!')
+        return _interp_extrapolate(logmass, cls._logmh, cls._logms, cls._slopes)
 
     @staticmethod
     def scatter():
@@ -97,15 +201,18 @@ class Brook14(SMHM):
     # load data
     mh350B14,msB14 = np.loadtxt(DISDIR+'/data/smhm/brook.dat' ,unpack=True)
     h0 = cosmo.Hz(0)/100.  # convert from 350c units to 200c units, assuming NFW
-    c350 = colossus.halo.concentration.concentration(mh350B14/h0, '350c', 0, model='diemer19')
-    m200_div_h, r200_div_h, c200 = colossus.halo.mass_defs.changeMassDefinition(mh350B14/h0, c350, 0, '350c', '200c')
-    mh200B14,r200 = m200_div_h * h0, r200_div_h * h0
-    mstarB14 = interp1d(np.log(mh200B14),np.log(msB14),kind='linear',fill_value='extrapolate',bounds_error=False)    
+    mh200B14,r200 = _brook14_to_200c(DISDIR, h0)
+    _logmh, _logms = _log_table(mh200B14, msB14)
+    _slopes = _end_slopes(_logmh, _logms)
 
     @classmethod
     def central_value(cls, mass, z=0.):
+        return np.exp(cls.central_value_log(np.log(mass), z=z))
+
+    @classmethod
+    def central_value_log(cls, logmass, z=0.):
         if z !=0:  warnings.warn('Brook+ 2014 SMHM has no support for z>0, using z=0 relation!')
-        return np.exp(cls.mstarB14(np.log(mass)))
+        return _interp_extrapolate(logmass, cls._logmh, cls._logms, cls._slopes)
 
     @staticmethod
     def scatter():
@@ -124,15 +231,43 @@ class Behroozi13(SMHM):
 
     # load data
     mhB13,msB13 = np.loadtxt(DISDIR+'/data/smhm/behroozi.dat' ,unpack=True)
-    mstarB13 = interp1d(np.log(mhB13),np.log(msB13),kind='linear',fill_value='extrapolate',bounds_error=False)
+    _logmh, _logms = _log_table(mhB13, msB13)
+    _slopes = _end_slopes(_logmh, _logms)
 
     @classmethod
     def central_value(cls, mass, z=0.):
-        if z != 0: warnings.warn('Behroozi+ 2013 SMHM relation for z>0 not implemented, using z=0 relation!')            
-        return np.exp(cls.mstarB13(np.log(mass)))
+        return np.exp(cls.central_value_log(np.log(mass), z=z))
+
+    @classmethod
+    def central_value_log(cls, logmass, z=0.):
+        if z != 0: warnings.warn('Behroozi+ 2013 SMHM relation for z>0 not implemented, using z=0 relation!')
+        return _interp_extrapolate(logmass, cls._logmh, cls._logms, cls._slopes)
 
     @staticmethod
     def scatter():
         warnings.warn('scatter in Behroozi+ 2013 SMHM relation not quantified, using Moster+ 2013 scatter!')
         return 0.15
 
+
+
+
+############################################################
+
+
+@functools.lru_cache(maxsize=None)
+def _get_relation(model, scatter):
+    """Shared SMHM instance for the given model name and scatter setting."""
+    relations = { cls.name: cls for cls in SMHM.__subclasses__() }
+    if model not in relations:
+        raise ValueError('no SMHM relation named '+str(model))
+    return relations[model](scatter=scatter)
+
+def stellar_mass(mhalo, model='Moster13', z=0., scatter=True):
+    """
+    Returns the stellar mass for the given halo mass(es) from the named
+    SMHM relation, reusing one relation instance per (model, scatter).
+    """
+    relation = _get_relation(model, scatter)
+    if not scatter:
+        return relation.central_value(mhalo, z=z)
+    return relation(mhalo, z=z)
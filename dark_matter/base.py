@@ -1,6 +1,7 @@
+import numpy as np
 import numpy.random as random
 
-from ..relations import Relation
+from ..relations import Relation, LN10
 
 
 class DarkMatterModel():
@@ -44,7 +45,7 @@ class DarkMatterModel():
             median = self.central_value(mass, massdef, z)
 
             if self.sample_scatter:
-                return median * 10**random.normal(loc=0,scale=self.scatter(),size=len(mass))
+                return median * np.exp(LN10*self.scatter()*random.standard_normal(size=len(mass)))
             else:
                 return median
 
@@ -1,6 +1,7 @@
 import warnings
+import numpy as np
 import numpy.random as random
-from ..relations import Relation
+from ..relations import Relation, LN10
 import colossus
 cosmoWMAP5 = colossus.cosmology.cosmology.setCosmology('WMAP5')
 cosmoP13 = colossus.cosmology.cosmology.setCosmology('planck13')
@@ -29,10 +30,12 @@ class MassConcentration(Relation):
         """Lognormal scatter."""
         raise NotImplementedError('This is an abstract class.')
 
-    def __call__(self, mass, z):
+    def __call__(self, mass, z, noise=None):
         median = self.central_value(mass, z)
         if self.sample_scatter:
-            return median * 10**random.normal(loc=0,scale=self.scatter(),size=len(mass))
+            if noise is None:
+                noise = random.standard_normal(size=len(mass))
+            return median * np.exp(LN10*self.scatter()*noise)
         else:
             return median
 
@@ -20,22 +20,24 @@ class SubhaloMassFunction(Relation):
     def normalization():
         return NotImplementedError('This is an abstract class.')
     
-    def number_of_subhalos(self, mhost, min_mass):
+    def number_of_subhalos(self, mhost, min_mass, rng=None):
+        """rng = optional numpy Generator to draw from, instead of numpy.random"""
         a,K0,baryon_reduction = self.alpha(), self.normalization(), self.parameters['baryon_reduction']
         median = K0 * mhost / (a-1) * (min_mass**(1-a) - mhost**(1-a))
         if self.sample_scatter:
-            return int(round(random.poisson(lam=median) * baryon_reduction))
+            rng = random if rng is None else rng
+            return int(round(rng.poisson(lam=median) * baryon_reduction))
         else:
             return median
 
     @classmethod
-    def __call__(cls, min_mass, max_mass, nsubhalos):
+    def __call__(cls, min_mass, max_mass, nsubhalos, rng=None):
         return cls._sample_negative_power(alpha=-cls.alpha(),
                                            low=min_mass, high=max_mass,
-                                           size=nsubhalos)
+                                           size=nsubhalos, rng=rng)
         
     # numpy/scipy doesn't allow for negative power law exponents
-    def _sample_negative_power(alpha=-2, low=1e7, high=1e12, size=1):
+    def _sample_negative_power(alpha=-2, low=1e7, high=1e12, size=1, rng=None):
         """
         This is written differently from most power law samplers, in that
         it takes the power law exponent, alpha<0, instead of alpha+1.
@@ -44,7 +46,7 @@ class SubhaloMassFunction(Relation):
         python-generating-random-numbers-from-a-power-law-distribution/31117560
         """
         aplus1 = alpha + 1
-        r = random.random(size=size)
+        r = (random if rng is None else rng).random(size=size)
         return (low**aplus1 + (high**aplus1 - low**aplus1)*r)**(1./aplus1)
 
 
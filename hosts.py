@@ -13,9 +13,9 @@ class Host:
     def mass():
         raise NotImplementedError('This is an abstract class')
             
-    def set_number_of_subhalos(self, min_mass):
+    def set_number_of_subhalos(self, min_mass, rng=None):
         self.subhalo_min_mass = min_mass
-        self.number_of_subhalos = self.subhalo_mass_function.number_of_subhalos(self.mass(), min_mass)
+        self.number_of_subhalos = self.subhalo_mass_function.number_of_subhalos(self.mass(), min_mass, rng=rng)
 
     
 class MilkyWay(Host):
@@ -2,6 +2,9 @@ import numpy as np
 import numpy.random as random
 
 
+LN10 = np.log(10.)  # for lognormal scatter, 10**x = exp(LN10*x)
+
+
 class Relation:
 
     name = 'Relation'
@@ -17,4 +20,8 @@ class Relation:
         raise NotImplementedError('This is an abstract class.')
     
     def __call__():
+        """
+        Relations with scatter may take an optional noise= argument: standard
+        normal deviates, one per input, used in place of fresh random draws.
+        """
         raise NotImplementedError('This is an abstract class.')
@@ -1,14 +1,30 @@
+import inspect
 import numpy as np
-import numpy.random as random
 from .vutils import mvir2sigLOS
 from . import hosts, baryons, dark_matter
 from .relations import Relation
 
 
+# codes for properties['density_profile'], indexing SatellitePopulation.density_profiles
+PROFILE_CORE, PROFILE_NFW, PROFILE_CORED, PROFILE_SIDM = range(4)
+
+
+
+def _call_relation(relation, *args, noise=None, **kwargs):
+    """
+    Calls the relation, passing pre-drawn noise only if its __call__ takes
+    it, so relations written without a noise argument still work.
+    """
+    if noise is not None and 'noise' in inspect.signature(relation.__call__).parameters:
+        kwargs['noise'] = noise
+    return relation(*args, **kwargs)
+
+
 
 class SatellitePopulation:
 
     name = 'Satellites'
+    density_profiles = ('coreNFW', 'nfw', 'cored', 'sidm')
     
     def generate_population(self):
         """
@@ -16,23 +32,45 @@ class SatellitePopulation:
 
         n = number of realizations to generate
         """
+        if self.density_profile != 'mix':
+            profile_code = self._profile_code(self.density_profile)  # fail before sampling
+
         self.properties['mass'] = self._sample_subhalo_masses()
-        self.properties['c200'] = self._sample_concentrations()
-        self.properties['mass_stars'] = self._sample_stellar_masses()
-        self.properties['rhalf2D'] = self._sample_galaxy_sizes()
+
+        # draw the lognormal scatter of all relations in one go
+        noise = self._rng.standard_normal((3, self.host.number_of_subhalos))
+        self.properties['c200'] = self._sample_concentrations(noise=noise[0])
+        self.properties['mass_stars'] = self._sample_stellar_masses(noise=noise[1])
+        self.properties['rhalf2D'] = self._sample_galaxy_sizes(noise=noise[2])
         
         if self.density_profile != 'mix':
-            self.properties['density_profile'] = np.repeat(self.density_profile, self.host.number_of_subhalos)
+            self.properties['density_profile'] = np.full(self.host.number_of_subhalos, profile_code, dtype=np.uint8)
         else:
-            self.properties['density_profile'] = np.repeat('coreNFW', self.host.number_of_subhalos)
-            self.properties['density_profile'][self.properties['mass'] <  self.mswitch_profile] = 'nfw'
+            self.properties['density_profile'] = np.where(self.properties['mass'] < self.mswitch_profile, np.uint8(PROFILE_NFW), np.uint8(PROFILE_CORE))
 
         self.properties['sigLOS'] = self.sample_velocity_dispersions()
 
+    def __setattr__(self, name, value):
+        # swapping the dark matter model, host, or a relation invalidates
+        # the cached relation settings
+        if not name.startswith('_') and (name in ('dark_matter','host') or isinstance(value, Relation)):
+            self.__dict__['_relations_changed'] = True
+        super().__setattr__(name, value)
+
+    def _profile_code(self, profile):
+        names = [ p.lower() for p in self.density_profiles ]
+        if profile.lower() not in names:
+            raise ValueError('unsupported density profile '+str(profile)+', must be one of '+', '.join(self.density_profiles)+' or mix')
+        return names.index(profile.lower())
+
+    def get_density_profile_names(self):
+        """Names of the density profiles assigned to each satellite."""
+        return np.array(self.density_profiles)[self.properties['density_profile']]
+
     def get_input_parameters(self):
         parameters = {}
         for key,val in self.__dict__.items():
-            if   key=='properties': continue
+            if   key=='properties' or key.startswith('_'): continue
             elif key=='dark_matter': parameters[key] = val
             elif key=='host': parameters[key] = val
             elif callable(val):
@@ -43,7 +81,7 @@ class SatellitePopulation:
         
     def print_input_parameters(self):
         for key,val in self.__dict__.items():
-            if   key=='properties' or key=='parameters': continue
+            if   key=='properties' or key=='parameters' or key.startswith('_'): continue
             elif key=='dark_matter': print(key,':',self.dark_matter.name,'(class Host)')
             elif key=='host': print(key,':',self.host.name,'(class DarkMatterModel)')
             elif callable(val):
@@ -99,75 +137,78 @@ class SatellitePopulation:
 
     def _sample_subhalo_masses(self):
         m = self.host.subhalo_mass_function(self.min_mass, self.host.mass(),
-                                            self.host.number_of_subhalos)
+                                            self.host.number_of_subhalos, rng=self._rng)
         if isinstance(self.dark_matter, dark_matter.models.WDM):
             tf = self.dark_matter.transfer_function(m, self.dark_matter.mWDM)
-            mask = np.less_equal(random.random(size=len(m)), tf)
-            self.host.number_of_subhalos = sum(mask)
+            mask = self._rng.random(len(m)) <= tf
+            self.host.number_of_subhalos = int(mask.sum())
             return m[mask]
         else:
             return m
         
-    def _sample_concentrations(self):
-        c = self.concentration(self.properties['mass'], self.z_infall)
+    def _sample_concentrations(self, noise=None):
+        c = _call_relation(self.concentration, self.properties['mass'], self.z_infall, noise=noise)
+        if self._relations_changed: self._update_relation_cache()
+        if self._modified_concentration is None: return c
+        return self._modified_concentration(self.properties['mass'], c, self.dark_matter, z=self.z_infall)
+
+    def _update_relation_cache(self):
         relations = self.get_relations()
-        for name,relation in relations.items():
-            if isinstance(relation, dark_matter.models.ModifiedConcentration):
-                cmod = relation(self.properties['mass'], c, self.dark_matter, z=self.z_infall)
-                return cmod
-        return c
-
-    def _sample_stellar_masses(self):
-        mstar = self.smhm(self.properties['mass'], z=self.z_infall)
-        mstar *= self.occupation_fraction.mask_dark_galaxies(self.properties['mass'])
+        self._modified_concentration = next((relation for relation in relations.values()
+                                             if isinstance(relation, dark_matter.models.ModifiedConcentration)), None)
+
+        c_model = self.concentration.name
+        self._c_model_short = c_model[0].lower()+c_model[-2:]
+        if self._c_model_short=='d19': self._c_model_short = 'd15'
+        self._relations_changed = False
+
+    def _sample_stellar_masses(self, noise=None):
+        # only evaluate the SMHM for halos that host a galaxy
+        mass = self.properties['mass']
+        is_luminous = self.occupation_fraction.mask_dark_galaxies(mass, rng=self._rng)
+        mstar = np.zeros_like(mass)
+        mstar[is_luminous] = _call_relation(self.smhm, mass[is_luminous], z=self.z_infall,
+                                            noise=None if noise is None else noise[is_luminous])
         return mstar
 
-    def _sample_galaxy_sizes(self):
-        rhalf = np.zeros(self.host.number_of_subhalos)
+    def _sample_galaxy_sizes(self, noise=None):
+        # dark satellites get zero size; custom relations may not handle mstar=0
         mstar = self.properties['mass_stars']
-        rhalf[mstar>0] = self.rhalf_2D(mstar[mstar>0])
+        is_galaxy = mstar > 0
+        rhalf = np.zeros_like(mstar)
+        rhalf[is_galaxy] = _call_relation(self.rhalf_2D, mstar[is_galaxy],
+                                          noise=None if noise is None else noise[is_galaxy])
         return rhalf
     
     def sample_velocity_dispersions(self):
 
-        c_model = self.concentration.name
-        c_model_short = c_model[0].lower()+c_model[-2:]
-        if c_model_short=='d19': c_model_short = 'd15'
-
-        sigLOS = np.zeros(self.host.number_of_subhalos)
-        mstar = self.properties['mass_stars']
-        is_galaxy = mstar>0
+        if self._relations_changed: self._update_relation_cache()
+        is_galaxy = self.properties['mass_stars'] > 0
         
         if self.density_profile != 'mix':
             sigLOS = mvir2sigLOS(self.properties['mass'],
-                                 self.density_profile,
+                                 self.density_profiles[self._profile_code(self.density_profile)],
                                  mleft=self.mleft,
                                  zin=self.z_infall,
                                  mstar=self.properties['mass_stars'],
                                  Re0=self.properties['rhalf2D'],
                                  c200=self.properties['c200'],
-                                 cNFW_method=c_model_short,
+                                 cNFW_method=self._c_model_short,
                                  sigmaSI=self.dark_matter.sigSI if isinstance(self.dark_matter, dark_matter.models.SIDM) else None)
         else:
             sigLOS = np.zeros(self.host.number_of_subhalos)
-            icore = np.where(is_galaxy * (self.properties['density_profile']=='coreNFW'))[0]
-            sigLOS[icore] = mvir2sigLOS(self.properties['mass'][icore],
-                                        'coreNFW',
-                                        mleft=self.mleft,
-                                        zin=self.z_infall,
-                                        mstar=self.properties['mass_stars'][icore],
-                                        Re0=self.properties['rhalf2D'][icore],
-                                        c200=self.properties['c200'][icore],
-                                        cNFW_method=c_model_short)
-            icusp = np.where(is_galaxy * (self.properties['density_profile'] == 'nfw'))[0]
-            sigLOS[icusp] = mvir2sigLOS(self.properties['mass'][icusp],
-                                        'nfw',
-                                        mleft=self.mleft,
-                                        zin=self.z_infall,
-                                        mstar=self.properties['mass_stars'][icusp],
-                                        Re0=self.properties['rhalf2D'][icusp],
-                                        c200=self.properties['c200'][icusp],
-                                        cNFW_method=c_model_short)
+            is_core = is_galaxy & (self.properties['density_profile']==PROFILE_CORE)
+            is_cusp = is_galaxy & (self.properties['density_profile']==PROFILE_NFW)
+            for code, mask in [(PROFILE_CORE, is_core), (PROFILE_NFW, is_cusp)]:
+                if not mask.any(): continue
+                sigLOS[mask] = mvir2sigLOS(self.properties['mass'][mask],
+                                           self.density_profiles[code],
+                                           mleft=self.mleft,
+                                           zin=self.z_infall,
+                                           mstar=self.properties['mass_stars'][mask],
+                                           Re0=self.properties['rhalf2D'][mask],
+                                           c200=self.properties['c200'][mask],
+                                           cNFW_method=self._c_model_short)
 
         return sigLOS
 
@@ -175,6 +216,8 @@ class SatellitePopulation:
     def _finish_setup(self):
 
         self.properties = {}
+        if not hasattr(self, '_rng'): self._rng = np.random.default_rng()
+        if self.density_profile != 'mix': self._profile_code(self.density_profile)
     
         for name, attribute in self.dark_matter.__dict__.items():
             if isinstance(attribute, Relation):
@@ -185,6 +228,7 @@ class SatellitePopulation:
                 self.__dict__[name] = attribute
                 
         self.parameters = self.get_input_parameters()
+        self._update_relation_cache()
         
         
 class MilkyWaySatellites(SatellitePopulation):
@@ -192,9 +236,10 @@ class MilkyWaySatellites(SatellitePopulation):
     name = 'MilkyWaySatellites'
 
     def __init__(self, min_mass=1e7, density_profile='mix', mleft=1.,
-                 cosmology=dark_matter.models.CDM()):
+                 cosmology=dark_matter.models.CDM(), seed=None):
 
         # set parameters
+        self._rng = np.random.default_rng(seed)  # all sampling draws from this
         self.z_infall = 1.
         self.min_mass = min_mass
         self.massdef = '200c'
@@ -205,7 +250,7 @@ class MilkyWaySatellites(SatellitePopulation):
         # set dark matter model and host
         self.dark_matter = cosmology        
         self.host = hosts.MilkyWay(cosmology=cosmology)
-        self.host.set_number_of_subhalos(min_mass)
+        self.host.set_number_of_subhalos(min_mass, rng=self._rng)
         
         # choose relations
         self.concentration = dark_matter.concentrations.Diemer19(scatter=True)
@@ -3,7 +3,7 @@
 
 from sys import *
 from numpy import *
-from numpy.random import normal
+from numpy.random import standard_normal
 import matplotlib as mpl
 #mpl.rcParams['text.usetex'] = True
 #mpl.rcParams['font.family'] = 'serif'
@@ -267,7 +267,7 @@ def Reff(m200,profile,cK=5.,mleft=1,zin=0.,sigmaSI=None,mcore_thres=None,reff='r
         elif reff=='r17-1s':
             Re0 = 10**(0.268*log10(mstar)-2.11 - 0.234)
         elif reff=='r17scatter':
-            Re0 = 10**(0.268*log10(mstar)-2.11 + normal(loc=0,scale=0.234,size=len(mstar)))
+            Re0 = 10**(0.268*log10(mstar)-2.11 + 0.234*standard_normal(size=len(mstar)))
         elif reff=='d18':
             Re0 = 10**(0.23*log10(mstar)-1.93)  # 2D half-light radius from shany's 2018 paper (assumes V-band mass-to-light ratio = 2.0)
         elif reff=='j18':